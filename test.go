@@ -297,25 +297,47 @@ func main() {
 
 // --- Utility functions ---
 
-// Nueva función para rotar/voltear según orientación EXIF
+// Nueva función para rotar/voltear según orientación EXIF.
+// Cubre los 8 valores igual que ImageOps.exif_transpose en crop_gui.py: las
+// coordenadas de crop_coords.json se calculan sobre la imagen ya orientada,
+// así que ambos lados deben producir exactamente el mismo marco.
 func fixOrientation(img image.Image, orientation int) image.Image {
-	// Implementa aquí la lógica de rotación/flip según el valor de orientation (1-8)
-	// Por simplicidad, aquí solo muestro el caso más común (6 = rotar 90°)
+	b := img.Bounds()
+	w, h := b.Dx(), b.Dy()
+	outW, outH := w, h
+	// dst devuelve, para el píxel (x, y) del original, su posición en la imagen corregida
+	var dst func(x, y int) (int, int)
 	switch orientation {
-	case 6:
-		// Rotar 90° a la derecha
-		b := img.Bounds()
-		rotated := image.NewRGBA(image.Rect(0, 0, b.Dy(), b.Dx()))
-		for x := b.Min.X; x < b.Max.X; x++ {
-			for y := b.Min.Y; y < b.Max.Y; y++ {
-				rotated.Set(b.Max.Y-y-1, x, img.At(x, y))
-			}
-		}
-		return rotated
-	// Agrega aquí los otros casos (2-8) según la tabla EXIF
+	case 2: // Espejo horizontal
+		dst = func(x, y int) (int, int) { return w - 1 - x, y }
+	case 3: // Rotar 180°
+		dst = func(x, y int) (int, int) { return w - 1 - x, h - 1 - y }
+	case 4: // Espejo vertical
+		dst = func(x, y int) (int, int) { return x, h - 1 - y }
+	case 5: // Transponer (espejo sobre la diagonal principal)
+		outW, outH = h, w
+		dst = func(x, y int) (int, int) { return y, x }
+	case 6: // Rotar 90° a la derecha
+		outW, outH = h, w
+		dst = func(x, y int) (int, int) { return h - 1 - y, x }
+	case 7: // Transversa (espejo sobre la antidiagonal)
+		outW, outH = h, w
+		dst = func(x, y int) (int, int) { return h - 1 - y, w - 1 - x }
+	case 8: // Rotar 90° a la izquierda
+		outW, outH = h, w
+		dst = func(x, y int) (int, int) { return y, w - 1 - x }
 	default:
 		return img
 	}
+
+	out := image.NewRGBA(image.Rect(0, 0, outW, outH))
+	for x := 0; x < w; x++ {
+		for y := 0; y < h; y++ {
+			dx, dy := dst(x, y)
+			out.Set(dx, dy, img.At(b.Min.X+x, b.Min.Y+y))
+		}
+	}
+	return out
 }
 
 func load(path string) image.Image {
@@ -1,8 +1,7 @@
 import os
-import glob
 import re
 from instagrapi import Client
-from instagrapi.exceptions import LoginRequired
+from instagrapi.exceptions import ClientThrottledError, LoginRequired, PhotoNotUpload, PleaseWaitFewMinutes
 import logging
 import time
 from dotenv import load_dotenv # Import the library
@@ -20,60 +19,71 @@ SESSION_FILE = "session.json"
 CAPTION = """
 oyeoyepuedequeestoestéfuncionando
 """
-UPLOAD_DELAY_SECONDS = 5 # Add a small delay between uploads
+UPLOAD_DELAY_SECONDS = 5 # Base delay for the exponential backoff when Instagram throttles us
+UPLOAD_MAX_RETRIES = 5 # Attempts per tile before giving up on it
 
 # Setup basic logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Tile filenames produced by the Go splitter: tile_1.jpg, tile_2.jpg, ...
+_TILE_RE = re.compile(r"^tile_(\d+)\.jpg$")
+
 def get_sorted_tiles(directory):
     """Finds and sorts tile images numerically for correct Instagram upload order (1.jpg first)."""
-    pattern = os.path.join(directory, "tile_*.jpg")
-    files = glob.glob(pattern)
-    logging.debug(f"Found files before sort: {[os.path.basename(f) for f in files]}")
-
-    def sort_key(filepath):
-        filename = os.path.basename(filepath)
-        # Match one or more digits between tile_ and .jpg
-        match = re.match(r"^tile_(\\d+)\\.jpg$", filename)
+    # Plain prefix/suffix checks on a single directory scan (no fnmatch/regex like glob)
+    try:
+        with os.scandir(directory) as it:
+            files = [entry.path for entry in it
+                     if entry.is_file() and entry.name.startswith("tile_") and entry.name.endswith(".jpg")]
+    except OSError: # Missing, not a directory or unreadable: no tiles, as with glob
+        files = []
+    # Only build the basename list when DEBUG is actually enabled
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug(f"Found files before sort: {[os.path.basename(f) for f in files]}")
+
+    def sort_key(filename):
+        match = _TILE_RE.match(filename)
         if match:
             num = int(match.group(1))
 
             if num <= 0: # Tile numbers should be positive.
                 logging.warning(f"File {filename} has non-positive number {num}. Will be sorted last.")
-                return (float('inf'), float('inf'))
+                return float('inf')
 
-            # Assuming a fixed number of 3 columns for the grid, as specified.
-            # The number of rows can vary.
-            # This key ensures sorting happens in the natural reading order:
+            # The (row, col) position in the grid follows reading order, so
+            # sorting by the tile number alone gives the same order:
             # tile_1, tile_2, tile_3 (first row)
             # tile_4, tile_5, tile_6 (second row)
             # and so on.
-            fixed_cols = 3
-            r = (num - 1) // fixed_cols
-            c = (num - 1) % fixed_cols
-            logging.debug(f"File: {filename}, Num: {num}, Key: {(r, c)}")
-            return (r, c) # Sort by (row, col) tuple
+            return num
         else:
-            logging.warning(f"Filename {filename} does not match expected pattern '^tile_\\\\d+\\\\.jpg$'. Will be sorted last.")
+            logging.warning(f"Filename {filename} does not match expected pattern '{_TILE_RE.pattern}'. Will be sorted last.")
             # Sort unmatchable files last
-            return (float('inf'), float('inf'))
+            return float('inf')
 
-    # Sort files based on the (row, col) key, ascending order (default).
+    # Sort files based on the tile number, ascending order (default).
     # This should result in ['tile_1.jpg', 'tile_2.jpg', ..., 'tile_9.jpg'] for a standard 3x3 grid.
+    # Decorate once per file with (key, basename, path) so the basename computed
+    # for the key is reused for the log below instead of being recomputed.
     try:
+        decorated = []
+        for f in files:
+            filename = os.path.basename(f)
+            decorated.append((sort_key(filename), filename, f))
         # Sort ascending (reverse=False is the default, making it explicit)
-        files.sort(key=sort_key, reverse=False)
+        decorated.sort(reverse=False)
     except Exception as e:
         logging.error(f"Error during sorting: {e}")
-        # Return unsorted or partially sorted list in case of error
+        # Return unsorted list in case of error
         return files
+    files = [f for _, _, f in decorated]
 
     if not files:
-        logging.warning(f"No files matching '{pattern}' found in '{directory}'")
+        logging.warning(f"No files matching 'tile_*.jpg' found in '{directory}'")
     else:
         # Log the order *after* sorting to verify
         logging.info(f"Found {len(files)} tiles. Sorted upload order (should be tile_1.jpg first):")
-        sorted_basenames = [os.path.basename(f) for f in files]
+        sorted_basenames = [filename for _, filename, _ in decorated]
         # Log the full sorted list for clarity
         logging.info(f"  - Files: {sorted_basenames}")
 
@@ -88,16 +98,13 @@ def login_client():
         try:
             cl.load_settings(SESSION_FILE)
             logging.info(f"Loaded session from {SESSION_FILE}")
-            cl.login(INSTAGRAM_USERNAME, INSTAGRAM_PASSWORD)
-            # Check if session is valid
+            # Check if session is valid; only log in again if it is not
             try:
                  cl.get_timeline_feed()
-                 logging.info("Session is valid.")
+                 logging.info("Session is valid; skipped login.")
             except LoginRequired:
                  logging.warning("Session expired or invalid. Re-login required.")
-                 os.remove(SESSION_FILE) # Remove invalid session file
-                 cl = Client() # Re-initialize client
-                 cl.login(INSTAGRAM_USERNAME, INSTAGRAM_PASSWORD)
+                 cl.login(INSTAGRAM_USERNAME, INSTAGRAM_PASSWORD, relogin=True) # Force a real login despite the loaded user_id
         except Exception as e:
             logging.warning(f"Could not load session: {e}. Performing full login.")
             cl = Client()
@@ -111,6 +118,24 @@ def login_client():
     logging.info(f"Session saved to {SESSION_FILE}")
     return cl
 
+def upload_with_backoff(client, tile_path):
+    """Uploads a single tile, retrying with exponential backoff while Instagram throttles us."""
+    for attempt in range(UPLOAD_MAX_RETRIES):
+        try:
+            return client.photo_upload(tile_path, caption=CAPTION)
+        except (ClientThrottledError, PleaseWaitFewMinutes, PhotoNotUpload) as e:
+            # The raw upload step reports every non-200 (429 included) as PhotoNotUpload;
+            # only retry it when it was actually a rate limit.
+            if isinstance(e, PhotoNotUpload):
+                response = getattr(e, "response", None)
+                if response is None or response.status_code != 429:
+                    raise
+            if attempt == UPLOAD_MAX_RETRIES - 1:
+                raise
+            delay = UPLOAD_DELAY_SECONDS * 2 ** attempt
+            logging.warning(f"  Rate limited ({e}). Retrying in {delay} seconds...")
+            time.sleep(delay)
+
 def main():
     if not INSTAGRAM_USERNAME or not INSTAGRAM_PASSWORD:
         logging.error("Error: INSTA_USER and INSTA_PASS environment variables must be set.")
@@ -136,13 +161,10 @@ def main():
     for i, tile_path in enumerate(tiles_to_upload):
         logging.info(f"Uploading tile {i+1}/{len(tiles_to_upload)}: {os.path.basename(tile_path)}...")
         try:
-            media = client.photo_upload(tile_path, caption=CAPTION)
+            # Uploads stay sequential: the profile grid order depends on upload order
+            media = upload_with_backoff(client, tile_path)
             logging.info(f"  Successfully uploaded: {media.pk} (Code: {media.code})")
             successful_uploads += 1
-            # Add a delay to avoid rate limiting
-            if i < len(tiles_to_upload) - 1:
-                 logging.info(f"  Waiting {UPLOAD_DELAY_SECONDS} seconds...")
-                 time.sleep(UPLOAD_DELAY_SECONDS)
         except Exception as e:
             logging.error(f"  Failed to upload {os.path.basename(tile_path)}: {e}")
             # Optional: Decide whether to stop or continue on error